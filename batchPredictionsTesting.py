@@ -1,29 +1,30 @@
 import os
-import json
-import time
 import logging
 from google.cloud import storage
 import vertexai
-from vertexai.batch_prediction import BatchPredictionJob
 from vertexai.generative_models import GenerativeModel, GenerationConfig
+from batch_jobs import (
+    PROJECT_ID,
+    BUCKET_NAME,
+    REQUESTS_FOLDER,
+    MODEL_ID,
+    generate_jsonl_file,
+    upload_file_to_gcs,
+    run_batch_prediction,
+)
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Set up Vertex AI
-PROJECT_ID = "tonal-topic-448519-m2"
 LOCATION = "asia-south1"
 vertexai.init(project=PROJECT_ID, location=LOCATION)
 
 # Cloud Storage bucket details
-BUCKET_NAME = "waada_bucket"
 AUDIO_FOLDER = "Waada dataset/"
-REQUESTS_FOLDER = "Waada_req/requests/"
-OUTPUT_URI = "gs://waada_bucket/model_output"
 
-# Gemini model and output schema
-MODEL_ID = "gemini-1.5-flash-002"
+# Gemini output schema
 OUTPUT_SCHEMA = {
     "type": "object",
     "properties": {
@@ -196,48 +197,6 @@ Please provide your analysis in a structured JSON format as specified in the sch
     }
     return entry
 
-def generate_jsonl_file(jsonl_entries, output_file_path):
-    with open(output_file_path, 'w', encoding='utf-8') as f:
-        for entry in jsonl_entries:
-            json_line = json.dumps(entry, ensure_ascii=False)
-            f.write(json_line + "\n")
-    logger.info(f"JSONL file created at {output_file_path}")
-
-def upload_file_to_gcs(local_file, bucket_name, destination_blob_name):
-    client = storage.Client(project=PROJECT_ID)
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(local_file)
-    logger.info(f"Uploaded {local_file} to gs://{bucket_name}/{destination_blob_name}")
-
-def run_batch_prediction(input_uri):
-    try:
-        batch_prediction_job = BatchPredictionJob.submit(
-            source_model=MODEL_ID,
-            input_dataset=input_uri,
-            output_uri_prefix=OUTPUT_URI,
-        )
-
-        logger.info(f"Job resource name: {batch_prediction_job.resource_name}")
-        logger.info(f"Model resource name with the job: {batch_prediction_job.model_name}")
-        logger.info(f"Job state: {batch_prediction_job.state.name}")
-
-        while not batch_prediction_job.has_ended:
-            time.sleep(5)
-            batch_prediction_job.refresh()
-
-        if batch_prediction_job.has_succeeded:
-            logger.info("Batch prediction job succeeded!")
-        else:
-            logger.error(f"Batch prediction job failed: {batch_prediction_job.error}")
-
-        logger.info(f"Job output location: {batch_prediction_job.output_location}")
-        return batch_prediction_job.output_location
-
-    except Exception as e:
-        logger.error(f"Error during batch prediction: {e}")
-        return {"error": str(e)}
-
 if __name__ == "__main__":
     audio_files = list_audio_files(BUCKET_NAME, AUDIO_FOLDER)
     jsonl_entries = [create_jsonl_request_entry(uri) for uri in audio_files]
@@ -0,0 +1,64 @@
+import json
+import time
+import logging
+
+from google.cloud import storage
+from vertexai.batch_prediction import BatchPredictionJob
+
+# GCS and batch prediction helpers shared by batchPredictionsTesting.py and the
+# server's micro-batch router. Nothing here runs at import time: the Vertex AI
+# project a job is submitted to is whatever the importing script passed to
+# vertexai.init.
+
+logger = logging.getLogger(__name__)
+
+# Cloud Storage project and bucket details
+PROJECT_ID = "tonal-topic-448519-m2"
+BUCKET_NAME = "waada_bucket"
+REQUESTS_FOLDER = "Waada_req/requests/"
+OUTPUT_URI = "gs://waada_bucket/model_output"
+
+MODEL_ID = "gemini-1.5-flash-002"
+
+
+def generate_jsonl_file(jsonl_entries, output_file_path):
+    with open(output_file_path, 'w', encoding='utf-8') as f:
+        for entry in jsonl_entries:
+            json_line = json.dumps(entry, ensure_ascii=False)
+            f.write(json_line + "\n")
+    logger.info(f"JSONL file created at {output_file_path}")
+
+def upload_file_to_gcs(local_file, bucket_name, destination_blob_name):
+    client = storage.Client(project=PROJECT_ID)
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(destination_blob_name)
+    blob.upload_from_filename(local_file)
+    logger.info(f"Uploaded {local_file} to gs://{bucket_name}/{destination_blob_name}")
+
+def run_batch_prediction(input_uri, output_uri=OUTPUT_URI):
+    try:
+        batch_prediction_job = BatchPredictionJob.submit(
+            source_model=MODEL_ID,
+            input_dataset=input_uri,
+            output_uri_prefix=output_uri,
+        )
+
+        logger.info(f"Job resource name: {batch_prediction_job.resource_name}")
+        logger.info(f"Model resource name with the job: {batch_prediction_job.model_name}")
+        logger.info(f"Job state: {batch_prediction_job.state.name}")
+
+        while not batch_prediction_job.has_ended:
+            time.sleep(5)
+            batch_prediction_job.refresh()
+
+        if not batch_prediction_job.has_succeeded:
+            logger.error(f"Batch prediction job failed: {batch_prediction_job.error}")
+            return {"error": str(batch_prediction_job.error)}
+
+        logger.info("Batch prediction job succeeded!")
+        logger.info(f"Job output location: {batch_prediction_job.output_location}")
+        return batch_prediction_job.output_location
+
+    except Exception as e:
+        logger.error(f"Error during batch prediction: {e}")
+        return {"error": str(e)}
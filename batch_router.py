@@ -0,0 +1,184 @@
+import os
+import time
+import tempfile
+import threading
+import uuid
+import logging
+
+from google.cloud import storage
+
+from batch_jobs import (
+    BUCKET_NAME,
+    PROJECT_ID,
+    REQUESTS_FOLDER,
+    generate_jsonl_file,
+    run_batch_prediction,
+    upload_file_to_gcs,
+)
+from evaluation_records import read_prediction_line
+
+logger = logging.getLogger(__name__)
+
+ROUTED_AUDIO_FOLDER = "Waada routed/"
+ROUTED_REQUESTS_FOLDER = os.path.join(REQUESTS_FOLDER, "routed/")
+# Kept apart from OUTPUT_URI so getModelOutput.py never picks up routed
+# predictions, which the router has already recorded under their job ids
+ROUTED_OUTPUT_URI = f"gs://{BUCKET_NAME}/routed_output"
+
+
+class MicroBatchRouter:
+    """Collects low-priority /analyze uploads and sends them to Gemini as one batch prediction job.
+
+    Uploads are flushed once max_batch_size of them are waiting or the oldest
+    has waited max_wait_seconds. Each flush runs in its own thread because a
+    batch job takes minutes to hours, and the window keeps filling meanwhile.
+    When the job ends, every prediction is matched back to its upload by the
+    audio URI and handed to on_result(job_id, item, gemini_analysis).
+    Finished jobs are forgotten result_ttl_seconds after they end.
+    """
+
+    def __init__(self, build_request, on_result, max_batch_size=50, max_wait_seconds=600,
+                 result_ttl_seconds=3600):
+        self.build_request = build_request
+        self.on_result = on_result
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.jobs = {}
+        self.pending = []
+        self.condition = threading.Condition()
+        threading.Thread(target=self._window_loop, daemon=True).start()
+
+    def enqueue(self, file_path, file_name, **metadata):
+        """Queues an audio file (which the router deletes once uploaded) and returns its job id."""
+        job_id = uuid.uuid4().hex
+        item = {
+            "job_id": job_id,
+            "file_path": file_path,
+            "file_name": file_name,
+            "queued_at": time.time(),
+            **metadata,
+        }
+        with self.condition:
+            self._evict_finished_jobs()
+            self.jobs[job_id] = {"status": "queued", "fileName": file_name}
+            self.pending.append(item)
+            self.condition.notify()
+        logger.info("Queued %s for batch prediction as job %s", file_name, job_id)
+        return job_id
+
+    def get_job(self, job_id):
+        with self.condition:
+            self._evict_finished_jobs()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key != "finished_at"}
+
+    def _set_job(self, job_id, **fields):
+        with self.condition:
+            if fields.get("status") in ("completed", "error"):
+                fields["finished_at"] = time.time()
+            self.jobs[job_id].update(fields)
+
+    def _evict_finished_jobs(self):
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [job_id for job_id, job in self.jobs.items() if job.get("finished_at", cutoff) < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _window_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                deadline = self.pending[0]["queued_at"] + self.max_wait_seconds
+                while len(self.pending) < self.max_batch_size and time.time() < deadline:
+                    self.condition.wait(timeout=deadline - time.time())
+                batch = self.pending[:self.max_batch_size]
+                self.pending = self.pending[self.max_batch_size:]
+            threading.Thread(target=self._flush, args=(batch,), daemon=True).start()
+
+    def _flush(self, batch):
+        batch_id = uuid.uuid4().hex
+        logger.info("Submitting batch %s with %d uploads", batch_id, len(batch))
+        try:
+            items_by_uri = self._upload_batch(batch_id, batch)
+            output_location = run_batch_prediction(
+                self._upload_requests(batch_id, items_by_uri),
+                output_uri=ROUTED_OUTPUT_URI
+            )
+            if isinstance(output_location, dict):
+                raise RuntimeError(output_location["error"])
+            predictions = self._download_predictions(output_location)
+        except Exception as e:
+            logger.error("Batch %s failed: %s", batch_id, str(e))
+            for item in batch:
+                if os.path.exists(item["file_path"]):
+                    os.unlink(item["file_path"])
+                self._set_job(item["job_id"], status="error", error=str(e))
+            return
+
+        for uri, item in items_by_uri.items():
+            if uri not in predictions:
+                self._set_job(item["job_id"], status="error", error="No prediction returned for this file")
+                continue
+            gemini_analysis = predictions[uri]
+            if gemini_analysis is None:
+                self._set_job(item["job_id"], status="error", error="Could not parse the model response for this file")
+                continue
+            try:
+                result = self.on_result(item["job_id"], item, gemini_analysis)
+            except Exception as e:
+                logger.error("Failed to handle result for job %s: %s", item["job_id"], str(e))
+                self._set_job(item["job_id"], status="error", error=str(e))
+                continue
+            self._set_job(item["job_id"], status="completed", result=result)
+        logger.info("Batch %s complete", batch_id)
+
+    def _upload_batch(self, batch_id, batch):
+        items_by_uri = {}
+        for item in batch:
+            blob_name = f"{ROUTED_AUDIO_FOLDER}{batch_id}/{item['job_id']}.mp3"
+            try:
+                upload_file_to_gcs(item["file_path"], BUCKET_NAME, blob_name)
+            finally:
+                os.unlink(item["file_path"])
+            items_by_uri[f"gs://{BUCKET_NAME}/{blob_name}"] = item
+            self._set_job(item["job_id"], status="submitted", batchId=batch_id)
+        return items_by_uri
+
+    def _upload_requests(self, batch_id, items_by_uri):
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.jsonl') as temp_file:
+            requests_path = temp_file.name
+        try:
+            generate_jsonl_file([self.build_request(uri) for uri in items_by_uri], requests_path)
+            destination_blob = f"{ROUTED_REQUESTS_FOLDER}{batch_id}.jsonl"
+            upload_file_to_gcs(requests_path, BUCKET_NAME, destination_blob)
+        finally:
+            os.unlink(requests_path)
+        return f"gs://{BUCKET_NAME}/{destination_blob}"
+
+    def _download_predictions(self, output_location):
+        """Maps audio URI -> parsed analysis for every predictions.jsonl under output_location.
+
+        The analysis is None for files whose model response could not be parsed.
+        """
+        bucket_name, _, prefix = output_location.removeprefix("gs://").partition("/")
+        client = storage.Client(project=PROJECT_ID)
+        predictions = {}
+        for blob in client.bucket(bucket_name).list_blobs(prefix=prefix):
+            if not blob.name.endswith("predictions.jsonl"):
+                continue
+            for line in blob.download_as_text(encoding="utf-8").splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    prediction = read_prediction_line(line)
+                except ValueError as e:
+                    logger.error("Skipping malformed prediction line: %s", str(e))
+                    continue
+                if prediction is not None:
+                    file_uri, analysis, _ = prediction
+                    predictions[file_uri] = analysis
+        return predictions
@@ -0,0 +1,301 @@
+import json
+import os
+import re
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Batch outputs do not follow the response schema reliably: keys show up as
+# "Relevant Quotes", "RelevantQuotes" or "quotes" depending on the run, and the
+# JSON is usually wrapped in a ```json fence. Everything here matches on
+# normalized key names so /analyze results and batch lines parse the same way.
+
+CLASSIFICATIONS = ("Callback", "Fraud", "None")
+
+# Leading key fragment -> category name used by the /analyze response schema
+SCORE_CATEGORIES = {
+    "greeting": "Greeting & Personalization",
+    "language": "Language Clarity",
+    "product": "Product & Processes",
+    "pricing": "Pricing & Activation",
+}
+
+# 20241118-114549_KHW01337_3425910137-all.mp3 -> day 2024-11-18, agent KHW01337
+CALL_FILENAME_PATTERN = re.compile(r"^(\d{4})(\d{2})(\d{2})-\d{6}_([A-Za-z0-9]+)_")
+
+
+def normalize_key(key):
+    return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+
+def walk_fields(node, path=()):
+    """Yields (path, value) for every leaf, with each key in the path normalized."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from walk_fields(value, path + (normalize_key(key),))
+    elif isinstance(node, list) and not all(isinstance(item, str) for item in node):
+        for item in node:
+            yield from walk_fields(item, path)
+    else:
+        yield path, node
+
+
+def _as_text(value):
+    if isinstance(value, list):
+        return "\n".join(str(item) for item in value)
+    return value if isinstance(value, str) else ""
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.search(r"-?\d+(\.\d+)?", value)
+        if match:
+            return float(match.group())
+    return None
+
+
+# Gemini sometimes closes the top-level object early (e.g. a stray "}" right
+# after "transcription"), leaving the rest of the fields as ', "key": ...'.
+MAX_BRACE_REPAIRS = 5
+
+TRANSCRIPTION_PATTERN = re.compile(r'"transcri\w*"\s*:\s*(?=")', re.IGNORECASE)
+
+
+def parse_model_text(text):
+    """Parses the JSON object out of a raw model response, ignoring code fences and trailing notes.
+
+    If the decoded object is followed by "," it was closed early; the
+    offending "}" is dropped and decoding retried. Returns None rather than a
+    partial object when that does not recover the rest. Responses split over
+    several ```json blocks are merged into one object.
+    """
+    text = text.strip()
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+
+    decoder = json.JSONDecoder(strict=False)
+    for _ in range(MAX_BRACE_REPAIRS + 1):
+        try:
+            parsed, end = decoder.raw_decode(text)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(parsed, dict):
+            return None
+        if not text[end:].lstrip().startswith(","):
+            following = parse_model_text(text[end:]) if "{" in text[end:] else None
+            if following is not None:
+                parsed = {**following, **parsed}
+            return parsed
+        text = text[:end - 1] + text[end:]
+    return None
+
+
+def extract_transcription(text):
+    """Pulls just the transcription string out of a response that is not valid JSON overall."""
+    match = TRANSCRIPTION_PATTERN.search(text)
+    if match is None:
+        return None
+    try:
+        transcription, _ = json.JSONDecoder(strict=False).raw_decode(text, match.end())
+    except json.JSONDecodeError:
+        return None
+    return transcription if isinstance(transcription, str) and transcription.strip() else None
+
+
+def parse_call_filename(file_name):
+    """Returns (agent, day) from a dialer recording name, or (None, None) if it does not match."""
+    match = CALL_FILENAME_PATTERN.match(os.path.basename(file_name or ""))
+    if not match:
+        return None, None
+    year, month, day, agent = match.groups()
+    return agent, f"{year}-{month}-{day}"
+
+
+def _score_category(path):
+    for part in path:
+        for prefix, category in SCORE_CATEGORIES.items():
+            if part.startswith(prefix):
+                return category
+    return None
+
+
+def extract_record(analysis):
+    """Pulls the searchable/aggregatable fields out of one evaluation, whatever its key style."""
+    transcription, quotes, feedback = [], [], []
+    successful = None
+    classification = None
+    compliance_score = None
+    scores = {}
+
+    for path, value in walk_fields(analysis):
+        if not path:
+            continue
+        key = path[-1]
+        if "transcript" in key:
+            transcription.append(_as_text(value))
+        elif "quote" in key:
+            quotes.append(_as_text(value))
+        elif "feedback" in key:
+            feedback.append(_as_text(value))
+
+        if key == "successful" and isinstance(value, bool) and successful is None:
+            successful = value
+        elif key.endswith("classification") and value in CLASSIFICATIONS and classification is None:
+            classification = value
+        elif key in ("score", "compliancescore") and any("compliance" in part for part in path[:-1]):
+            if compliance_score is None:
+                compliance_score = _as_number(value)
+        elif key == "score":
+            category = _score_category(path[:-1])
+            if category is not None and category not in scores:
+                score = _as_number(value)
+                if score is not None:
+                    scores[category] = score
+
+    if classification is None and successful:
+        classification = "None"
+
+    return {
+        "complete": True,
+        "transcription": "\n".join(filter(None, transcription)),
+        "quotes": "\n".join(filter(None, quotes)),
+        "feedback": "\n".join(filter(None, feedback)),
+        "successful": successful,
+        "classification": classification,
+        "compliance_score": compliance_score,
+        "scores": scores,
+    }
+
+
+def transcription_only_record(transcription):
+    """Record for a response where only the transcription could be recovered: searchable, but not scored."""
+    return {
+        "complete": False,
+        "transcription": transcription,
+        "quotes": "",
+        "feedback": "",
+        "successful": None,
+        "classification": None,
+        "compliance_score": None,
+        "scores": {},
+    }
+
+
+def _read_prediction_entry(line):
+    """Returns (file_uri, model_text, processed_time) for a predictions.jsonl line, or None without a response."""
+    entry = json.loads(line)
+    file_uri = None
+    for content in entry.get("request", {}).get("contents", []):
+        for part in content.get("parts", []):
+            if part.get("file_data"):
+                file_uri = part["file_data"].get("file_uri")
+
+    candidates = (entry.get("response") or {}).get("candidates") or []
+    if not file_uri or not candidates:
+        return None
+    texts = [part.get("text", "") for part in candidates[0].get("content", {}).get("parts", [])]
+    return file_uri, "".join(texts), entry.get("processed_time")
+
+
+def read_prediction_line(line):
+    """Turns one line of a batch predictions.jsonl into (file_uri, analysis, processed_time).
+
+    analysis is None when the line has a model response that could not be parsed.
+    """
+    prediction = _read_prediction_entry(line)
+    if prediction is None:
+        return None
+    file_uri, text, processed_time = prediction
+    analysis = parse_model_text(text)
+    if analysis is None:
+        logger.error("Could not parse model response for %s", file_uri)
+
+    return file_uri, analysis, processed_time
+
+
+def parse_prediction_line(line):
+    """Turns one line of a batch predictions.jsonl into (call_id, file_name, record, processed_time).
+
+    When the response is not valid JSON but its transcription is, the record
+    holds only the transcription and has "complete" set to False.
+    """
+    prediction = _read_prediction_entry(line)
+    if prediction is None:
+        return None
+    file_uri, text, processed_time = prediction
+    analysis = parse_model_text(text)
+    if analysis is not None:
+        record = extract_record(analysis)
+    else:
+        transcription = extract_transcription(text)
+        if transcription is None:
+            logger.error("Could not parse model response for %s", file_uri)
+            return None
+        logger.error("Could not parse model response for %s, keeping only its transcription", file_uri)
+        record = transcription_only_record(transcription)
+    return file_uri, os.path.basename(file_uri), record, processed_time
+
+
+def ingest_predictions_file(conn, path, on_prediction):
+    """Feeds lines of a batch predictions.jsonl added since the last call to on_prediction.
+
+    Progress is kept per file in the connection's ingested_files table. A file
+    whose first line changed since the last run (e.g. latest_predictions.jsonl
+    was re-downloaded) is read again from the start, so on_prediction must
+    treat a call_id it has already seen as a replacement. A line is counted as
+    skipped if on_prediction returns False.
+    Returns (ingested, skipped) line counts.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingested_files (
+            path TEXT PRIMARY KEY,
+            first_line_hash TEXT NOT NULL,
+            offset INTEGER NOT NULL
+        )
+    """)
+    path = os.path.abspath(path)
+    ingested = skipped = 0
+    with open(path, "rb") as f:
+        first_line_hash = hashlib.sha1(f.readline()).hexdigest()
+        row = conn.execute(
+            "SELECT first_line_hash, offset FROM ingested_files WHERE path = ?", (path,)
+        ).fetchone()
+        offset = 0
+        if row is not None and row[0] == first_line_hash:
+            offset = row[1]
+
+        f.seek(offset)
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break
+            offset += len(raw_line)
+            line = raw_line.decode("utf-8").strip()
+            if not line:
+                continue
+            try:
+                parsed = parse_prediction_line(line)
+            except ValueError as e:
+                logger.error("Skipping malformed prediction line: %s", str(e))
+                parsed = None
+            if parsed is None:
+                skipped += 1
+                continue
+            if on_prediction(*parsed) is False:
+                skipped += 1
+                continue
+            ingested += 1
+
+    conn.execute(
+        "INSERT INTO ingested_files (path, first_line_hash, offset) VALUES (?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET first_line_hash = excluded.first_line_hash, "
+        "offset = excluded.offset",
+        (path, first_line_hash, offset)
+    )
+    return ingested, skipped
@@ -1,4 +1,6 @@
 from google.cloud import storage
+from search_index import SearchIndex, DEFAULT_INDEX_PATH
+from score_stats import ScoreStats, DEFAULT_STATS_PATH
 
 # Initialize the client
 client = storage.Client()
@@ -34,3 +36,7 @@ else:
     latest_file.download_to_filename(local_filename)
 
     print(f"Downloaded the latest prediction file to {local_filename}")
+
+    # Make the new predictions searchable through /search and counted in /stats
+    SearchIndex(DEFAULT_INDEX_PATH).index_predictions_file(local_filename)
+    ScoreStats(DEFAULT_STATS_PATH).record_predictions_file(local_filename)
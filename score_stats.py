@@ -0,0 +1,325 @@
+import argparse
+import json
+import math
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from evaluation_records import (
+    SCORE_CATEGORIES,
+    extract_record,
+    ingest_predictions_file,
+    parse_call_filename,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATS_PATH = "score_stats.db"
+GROUP_BY_OPTIONS = ("all", "agent", "campaign")
+UNASSIGNED = "unassigned"
+
+COMPLIANCE_METRIC = "Critical Compliance Check"
+TOTAL_METRIC = "Total"
+
+# Consent verification alone is worth 50 compliance points, so anything below
+# that means consent was not properly obtained.
+COMPLIANCE_FAILURE_THRESHOLD = 50
+
+# Every score is out of at most 100, so a histogram with one bucket per point
+# is an exact, fixed-size sketch: percentiles never need the raw evaluations.
+SCORE_BUCKETS = 101
+
+
+def score_bucket(score):
+    return min(max(int(round(score)), 0), SCORE_BUCKETS - 1)
+
+
+def bucket_percentile(buckets, count, fraction):
+    """Returns the score at the given fraction from {bucket: count}, nearest-rank style."""
+    rank = max(1, math.ceil(fraction * count))
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen >= rank:
+            return bucket
+    return None
+
+
+def metric_values(record):
+    values = dict(record["scores"])
+    if len(values) == len(SCORE_CATEGORIES):
+        values[TOTAL_METRIC] = sum(values.values())
+    if record["compliance_score"] is not None:
+        values[COMPLIANCE_METRIC] = record["compliance_score"]
+    return values
+
+
+class ScoreStats:
+    """Rolling per-agent/per-campaign/per-day aggregates of evaluation scores.
+
+    Each evaluation is added to running counts, sums and score histograms as it
+    lands, so reading stats costs the same however many calls were evaluated.
+    The contribution of every call is kept so a re-evaluated call replaces its
+    previous numbers instead of being counted twice.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS evaluations (
+                    call_id TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    campaign TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    classified INTEGER NOT NULL,
+                    successful INTEGER NOT NULL,
+                    callback INTEGER NOT NULL,
+                    fraud INTEGER NOT NULL,
+                    compliance_failure INTEGER NOT NULL,
+                    metric_values TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS outcome_counts (
+                    dimension TEXT NOT NULL,
+                    group_key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    calls INTEGER NOT NULL,
+                    classified INTEGER NOT NULL,
+                    successful INTEGER NOT NULL,
+                    callbacks INTEGER NOT NULL,
+                    frauds INTEGER NOT NULL,
+                    compliance_failures INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, group_key, day)
+                );
+                CREATE TABLE IF NOT EXISTS score_sums (
+                    dimension TEXT NOT NULL,
+                    group_key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    PRIMARY KEY (dimension, group_key, day, metric)
+                );
+                CREATE TABLE IF NOT EXISTS score_buckets (
+                    dimension TEXT NOT NULL,
+                    group_key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, group_key, day, metric, bucket)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _apply(self, conn, evaluation, sign):
+        groups = [
+            ("all", "all"),
+            ("agent", evaluation["agent"]),
+            ("campaign", evaluation["campaign"]),
+        ]
+        values = json.loads(evaluation["metric_values"])
+        for dimension, group_key in groups:
+            key = (dimension, group_key, evaluation["day"])
+            conn.execute(
+                """INSERT INTO outcome_counts
+                       (dimension, group_key, day, calls, classified, successful, callbacks, frauds,
+                        compliance_failures)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (dimension, group_key, day) DO UPDATE SET
+                       calls = calls + excluded.calls,
+                       classified = classified + excluded.classified,
+                       successful = successful + excluded.successful,
+                       callbacks = callbacks + excluded.callbacks,
+                       frauds = frauds + excluded.frauds,
+                       compliance_failures = compliance_failures + excluded.compliance_failures""",
+                (*key, sign, sign * evaluation["classified"], sign * evaluation["successful"], sign * evaluation["callback"],
+                 sign * evaluation["fraud"], sign * evaluation["compliance_failure"])
+            )
+            for metric, value in values.items():
+                conn.execute(
+                    """INSERT INTO score_sums (dimension, group_key, day, metric, count, total)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (dimension, group_key, day, metric) DO UPDATE SET
+                           count = count + excluded.count, total = total + excluded.total""",
+                    (*key, metric, sign, sign * value)
+                )
+                conn.execute(
+                    """INSERT INTO score_buckets (dimension, group_key, day, metric, bucket, count)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (dimension, group_key, day, metric, bucket) DO UPDATE SET
+                           count = count + excluded.count""",
+                    (*key, metric, score_bucket(value), sign)
+                )
+
+    def _record(self, conn, call_id, agent, campaign, day, record):
+        previous = conn.execute("SELECT * FROM evaluations WHERE call_id = ?", (call_id,)).fetchone()
+        if previous is not None:
+            self._apply(conn, previous, -1)
+
+        # Calls without a success verdict stay out of the success/callback/fraud rates
+        classified = record["successful"] is not None
+        compliance_score = record["compliance_score"]
+        evaluation = {
+            "call_id": call_id,
+            "agent": agent or UNASSIGNED,
+            "campaign": campaign or UNASSIGNED,
+            "day": day,
+            "classified": int(classified),
+            "successful": int(classified and record["successful"]),
+            "callback": int(classified and record["classification"] == "Callback"),
+            "fraud": int(classified and record["classification"] == "Fraud"),
+            "compliance_failure": int(
+                compliance_score is not None and compliance_score < COMPLIANCE_FAILURE_THRESHOLD
+            ),
+            "metric_values": json.dumps(metric_values(record)),
+        }
+        conn.execute(
+            """INSERT OR REPLACE INTO evaluations
+                   (call_id, agent, campaign, day, classified, successful, callback, fraud,
+                    compliance_failure, metric_values)
+               VALUES (:call_id, :agent, :campaign, :day, :classified, :successful, :callback, :fraud,
+                       :compliance_failure, :metric_values)""",
+            evaluation
+        )
+        self._apply(conn, evaluation, 1)
+
+    def record_analysis(self, call_id, file_name, analysis, agent=None, campaign=None):
+        """Adds one geminiAnalysis result; agent and day fall back to the recording's file name."""
+        file_agent, file_day = parse_call_filename(file_name)
+        day = file_day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        with self._connect() as conn:
+            self._record(conn, call_id, agent or file_agent, campaign, day, extract_record(analysis))
+
+    def record_predictions_file(self, path, campaign=None):
+        """Adds the batch predictions appended to a predictions.jsonl since the last run."""
+        with self._connect() as conn:
+            def record_prediction(call_id, file_name, record, processed_time):
+                # A transcription-only record has no verdict or scores to aggregate
+                if not record["complete"]:
+                    return False
+                agent, day = parse_call_filename(file_name)
+                if day is None:
+                    day = (processed_time or datetime.now(timezone.utc).isoformat())[:10]
+                self._record(conn, call_id, agent, campaign, day, record)
+
+            recorded, skipped = ingest_predictions_file(conn, path, record_prediction)
+
+        logger.info(f"Recorded {recorded} evaluations from {path} ({skipped} skipped)")
+        return recorded
+
+    def stats(self, group_by="all", group_key=None, start_day=None, end_day=None, daily=False):
+        """Reads the aggregates for each group (and day, if daily) within the day range."""
+        if group_by not in GROUP_BY_OPTIONS:
+            raise ValueError(f"groupBy must be one of {', '.join(GROUP_BY_OPTIONS)}")
+        for name, day in (("from", start_day), ("to", end_day)):
+            if day is None:
+                continue
+            try:
+                valid = datetime.strptime(day, "%Y-%m-%d").strftime("%Y-%m-%d") == day
+            except ValueError:
+                valid = False
+            if not valid:
+                raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+        where = ["dimension = ?"]
+        params = [group_by]
+        if group_key is not None:
+            where.append("group_key = ?")
+            params.append(group_key)
+        if start_day is not None:
+            where.append("day >= ?")
+            params.append(start_day)
+        if end_day is not None:
+            where.append("day <= ?")
+            params.append(end_day)
+        where = " AND ".join(where)
+        group_columns = "group_key, day" if daily else "group_key"
+
+        with self._connect() as conn:
+            outcomes = conn.execute(
+                f"""SELECT {group_columns}, SUM(calls) AS calls, SUM(classified) AS classified,
+                           SUM(successful) AS successful,
+                           SUM(callbacks) AS callbacks, SUM(frauds) AS frauds,
+                           SUM(compliance_failures) AS compliance_failures
+                    FROM outcome_counts WHERE {where}
+                    GROUP BY {group_columns} HAVING SUM(calls) > 0 ORDER BY {group_columns}""",
+                params
+            ).fetchall()
+            sums = conn.execute(
+                f"""SELECT {group_columns}, metric, SUM(count) AS count, SUM(total) AS total
+                    FROM score_sums WHERE {where} GROUP BY {group_columns}, metric""",
+                params
+            ).fetchall()
+            buckets = conn.execute(
+                f"""SELECT {group_columns}, metric, bucket, SUM(count) AS count
+                    FROM score_buckets WHERE {where}
+                    GROUP BY {group_columns}, metric, bucket HAVING SUM(count) > 0""",
+                params
+            ).fetchall()
+
+        def group_of(row):
+            return (row["group_key"], row["day"]) if daily else (row["group_key"],)
+
+        histograms = {}
+        for row in buckets:
+            histograms.setdefault((group_of(row), row["metric"]), {})[row["bucket"]] = row["count"]
+
+        scores = {}
+        for row in sums:
+            if row["count"] <= 0:
+                continue
+            histogram = histograms.get((group_of(row), row["metric"]), {})
+            scores.setdefault(group_of(row), {})[row["metric"]] = {
+                "count": row["count"],
+                "mean": row["total"] / row["count"],
+                "p50": bucket_percentile(histogram, row["count"], 0.5),
+                "p90": bucket_percentile(histogram, row["count"], 0.9),
+            }
+
+        def rate(count, total):
+            return count / total if total else None
+
+        results = []
+        for row in outcomes:
+            classified = row["classified"]
+            group_scores = scores.get(group_of(row), {})
+            compliance_scored = group_scores.get(COMPLIANCE_METRIC, {}).get("count", 0)
+            result = {
+                "group": row["group_key"],
+                "calls": row["calls"],
+                "classified": classified,
+                "successRate": rate(row["successful"], classified),
+                "callbackRate": rate(row["callbacks"], classified),
+                "fraudRate": rate(row["frauds"], classified),
+                "complianceFailures": row["compliance_failures"],
+                "complianceFailureRate": rate(row["compliance_failures"], compliance_scored),
+                "scores": group_scores,
+            }
+            if daily:
+                result["day"] = row["day"]
+            results.append(result)
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add batch prediction outputs to the score aggregates.")
+    parser.add_argument("predictions", nargs="+", help="predictions.jsonl files to ingest")
+    parser.add_argument("--campaign", help="campaign the recordings belong to")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    score_stats = ScoreStats(DEFAULT_STATS_PATH)
+    for predictions_path in args.predictions:
+        score_stats.record_predictions_file(predictions_path, campaign=args.campaign)
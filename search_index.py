@@ -0,0 +1,271 @@
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+import logging
+from contextlib import contextmanager
+
+from evaluation_records import extract_record, ingest_predictions_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "search_index.db"
+SEARCH_FIELDS = ("transcription", "quotes", "feedback")
+
+# Arabic-script variants that show up in Urdu transcriptions depending on the
+# keyboard/model, folded to the Urdu code points so either spelling matches.
+URDU_CHAR_MAP = str.maketrans({
+    "ي": "ی",  # ARABIC YEH -> FARSI YEH
+    "ى": "ی",  # ALEF MAKSURA -> FARSI YEH
+    "ك": "ک",  # ARABIC KAF -> KEHEH
+    "ه": "ہ",  # HEH -> HEH GOAL
+    "ۃ": "ہ",  # TEH MARBUTA GOAL -> HEH GOAL
+    "ة": "ہ",  # TEH MARBUTA -> HEH GOAL
+    "أ": "ا",  # ALEF WITH HAMZA ABOVE -> ALEF
+    "إ": "ا",  # ALEF WITH HAMZA BELOW -> ALEF
+    "آ": "ا",  # ALEF WITH MADDA -> ALEF
+    "۔": " ",       # URDU FULL STOP
+    "،": " ",       # ARABIC COMMA
+    "؟": " ",       # ARABIC QUESTION MARK
+    "ـ": None,      # TATWEEL
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + i): str(i) for i in range(10)},  # Extended (Urdu) digits
+})
+
+# Harakat and other combining marks that are usually omitted in Urdu text.
+URDU_DIACRITICS = re.compile("[\u064b-\u065f\u0670\u06d6-\u06ed]")
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Words of the raw text, diacritics and tatweel included, for building snippets.
+RAW_TOKEN_PATTERN = re.compile("[\\w\u064b-\u065f\u0670\u06d6-\u06ed\u0640]+", re.UNICODE)
+
+# Nasalized endings are only dropped for these words; doing it for every
+# "-in"/"-ain" word would make English words like "chain" match "chai".
+ROMAN_URDU_NASALS = {"hain", "nahin", "mein", "kahin", "yahin", "wahin"}
+
+SNIPPET_TOKENS = 16
+
+
+def normalize_roman_urdu(token):
+    """Folds common Roman Urdu spelling variants: jee/ji, hain/hai, achha/acha, nahin/nahi.
+
+    Vowel-length and doubled-letter folding applies to every ASCII word, since
+    Roman Urdu and English share the alphabet; English words are folded too
+    (e.g. "good" matches "gud", "call" matches "cal"). Results show the raw
+    wording, so this only widens matches.
+    """
+    if token in ROMAN_URDU_NASALS:
+        token = token[:-1]
+    token = token.replace("ee", "i").replace("oo", "u")
+    token = re.sub(r"(.)\1+", r"\1", token)
+    return token
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", text or "").translate(URDU_CHAR_MAP)
+    text = URDU_DIACRITICS.sub("", text).lower()
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token.isascii() and token.isalpha():
+            token = normalize_roman_urdu(token)
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def query_terms(query):
+    """Splits a query into normalized terms, each a list of tokens: "quoted phrases" stay together."""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        tokens = normalize_text(phrase or word).split()
+        if tokens:
+            terms.append(tokens)
+    return terms
+
+
+def build_match_query(terms, field=None):
+    """Turns query terms into an FTS5 query where every term must match."""
+    match = " ".join(f'"{" ".join(tokens)}"' for tokens in terms)
+    if field:
+        match = f"{field} : ({match})"
+    return match
+
+
+def make_snippet(text, terms, size=SNIPPET_TOKENS):
+    """Cuts the raw text around the first matching term, marking matched words with [ ].
+
+    Words are compared in normalized form so the snippet lines up with what
+    FTS matched, but the original wording is what gets returned.
+    """
+    words = []
+    for raw in RAW_TOKEN_PATTERN.finditer(text or ""):
+        for token in normalize_text(raw.group()).split():
+            words.append((token, raw.start(), raw.end()))
+    tokens = [token for token, _, _ in words]
+
+    highlighted = set()
+    for term in terms:
+        for i in range(len(tokens) - len(term) + 1):
+            if tokens[i:i + len(term)] == term:
+                highlighted.update(range(i, i + len(term)))
+    if not highlighted:
+        return None
+
+    first = max(0, min(highlighted) - size // 4)
+    last = min(len(words), first + size) - 1
+    parts = ["…"] if first > 0 else []
+    position = words[first][1]
+    for i in range(first, last + 1):
+        _, start, end = words[i]
+        if start < position:
+            continue
+        parts.append(text[position:start])
+        parts.append(f"[{text[start:end]}]" if i in highlighted else text[start:end])
+        position = end
+    if last < len(words) - 1:
+        parts.append("…")
+    return " ".join("".join(parts).split())
+
+
+class SearchIndex:
+    """SQLite FTS5 index over transcriptions, relevant quotes and feedback of analyzed calls."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS calls (
+                    id INTEGER PRIMARY KEY,
+                    call_id TEXT UNIQUE NOT NULL,
+                    source TEXT NOT NULL,
+                    file_name TEXT,
+                    successful INTEGER,
+                    classification TEXT,
+                    compliance_score REAL,
+                    transcription TEXT,
+                    quotes TEXT,
+                    feedback TEXT,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS calls_successful ON calls (successful, classification);
+                CREATE INDEX IF NOT EXISTS calls_compliance ON calls (compliance_score);
+                CREATE VIRTUAL TABLE IF NOT EXISTS calls_fts USING fts5 (
+                    transcription, quotes, feedback,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _upsert(self, conn, call_id, source, file_name, record):
+        row = conn.execute("SELECT id FROM calls WHERE call_id = ?", (call_id,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM calls_fts WHERE rowid = ?", (row["id"],))
+            conn.execute("DELETE FROM calls WHERE id = ?", (row["id"],))
+
+        successful = None if record["successful"] is None else int(record["successful"])
+        cursor = conn.execute(
+            """INSERT INTO calls (call_id, source, file_name, successful, classification,
+                                  compliance_score, transcription, quotes, feedback, indexed_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (call_id, source, file_name, successful, record["classification"],
+             record["compliance_score"], record["transcription"], record["quotes"],
+             record["feedback"], time.time())
+        )
+        conn.execute(
+            "INSERT INTO calls_fts (rowid, transcription, quotes, feedback) VALUES (?, ?, ?, ?)",
+            (cursor.lastrowid, *(normalize_text(record[field]) for field in SEARCH_FIELDS))
+        )
+
+    def index_analysis(self, call_id, file_name, analysis, source="analyze"):
+        """Indexes (or re-indexes) a single geminiAnalysis result."""
+        with self._connect() as conn:
+            self._upsert(conn, call_id, source, file_name, extract_record(analysis))
+
+    def index_predictions_file(self, path):
+        """Indexes new lines of a batch predictions.jsonl, resuming from where the last run stopped.
+
+        Calls are keyed by their audio URI, so re-reading a file only replaces
+        existing entries.
+        """
+        with self._connect() as conn:
+            def index_prediction(call_id, file_name, record, processed_time):
+                self._upsert(conn, call_id, "batch", file_name, record)
+
+            indexed, skipped = ingest_predictions_file(conn, path, index_prediction)
+
+        logger.info(f"Indexed {indexed} calls from {path} ({skipped} skipped)")
+        return indexed
+
+    def search(self, query, field=None, successful=None, classification=None,
+               min_compliance=None, max_compliance=None, limit=20, offset=0):
+        if field is not None and field not in SEARCH_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(SEARCH_FIELDS)}")
+        if limit < 1 or offset < 0:
+            raise ValueError("limit must be positive and offset must not be negative")
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        sql = ["""
+            SELECT c.call_id, c.source, c.file_name, c.successful, c.classification,
+                   c.compliance_score, c.transcription, c.quotes, c.feedback
+            FROM calls_fts JOIN calls c ON c.id = calls_fts.rowid
+            WHERE calls_fts MATCH ?"""]
+        params = [build_match_query(terms, field)]
+        if successful is not None:
+            sql.append("AND c.successful = ?")
+            params.append(int(successful))
+        if classification is not None:
+            sql.append("AND c.classification = ?")
+            params.append(classification)
+        if min_compliance is not None:
+            sql.append("AND c.compliance_score >= ?")
+            params.append(min_compliance)
+        if max_compliance is not None:
+            sql.append("AND c.compliance_score <= ?")
+            params.append(max_compliance)
+        sql.append("ORDER BY bm25(calls_fts) LIMIT ? OFFSET ?")
+        params.extend([limit, offset])
+
+        with self._connect() as conn:
+            rows = conn.execute(" ".join(sql), params).fetchall()
+
+        def snippet(row):
+            for snippet_field in (field,) if field else SEARCH_FIELDS:
+                text = make_snippet(row[snippet_field], terms)
+                if text is not None:
+                    return text
+            return None
+
+        return [
+            {
+                "callId": row["call_id"],
+                "source": row["source"],
+                "fileName": row["file_name"],
+                "successful": None if row["successful"] is None else bool(row["successful"]),
+                "unsuccessfulClassification": row["classification"],
+                "complianceScore": row["compliance_score"],
+                "relevantQuotes": row["quotes"],
+                "snippet": snippet(row),
+            }
+            for row in rows
+        ]
+
+
+if __name__ == "__main__":
+    # python search_index.py latest_predictions.jsonl [more predictions.jsonl ...]
+    logging.basicConfig(level=logging.INFO)
+    index = SearchIndex(DEFAULT_INDEX_PATH)
+    for predictions_path in sys.argv[1:]:
+        index.index_predictions_file(predictions_path)
@@ -8,6 +8,10 @@ import vertexai
 from vertexai.generative_models import GenerativeModel, GenerationConfig, Part
 import json
 import logging
+import uuid
+from search_index import SearchIndex
+from score_stats import ScoreStats
+from batch_router import MicroBatchRouter
 
 
 logging.basicConfig(
@@ -207,6 +211,19 @@ Please provide your analysis in a structured JSON format as specified in the sch
 MODELID = "gemini-1.5-flash-002"
 model = GenerativeModel(MODELID)
 
+SEARCH_INDEX_PATH = "search_index.db"
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+SCORE_STATS_PATH = "score_stats.db"
+score_stats = ScoreStats(SCORE_STATS_PATH)
+
+# Low-priority uploads wait for up to this many files or seconds before being
+# sent to Gemini together as one batch prediction job
+BATCH_MAX_SIZE = 50
+BATCH_MAX_WAIT_SECONDS = 600
+# Finished low-priority jobs can be fetched from /jobs for this long
+BATCH_RESULT_TTL_SECONDS = 3600
+
 def analyze_audio(file_path):
     y, sr = librosa.load(file_path)
     duration = librosa.get_duration(y=y, sr=sr)
@@ -259,6 +276,7 @@ def analyze_audio(file_path):
     }
 
 def get_gemini_analysis(file_path):
+    """Returns (analysis, error). On failure the analysis is create_default_response's placeholder."""
     try:
         logger.info("Starting Gemini analysis for file: %s", file_path)
         
@@ -280,14 +298,15 @@ def get_gemini_analysis(file_path):
         try:
             parsed_json = json.loads(response.text)
             logger.info("Successfully parsed JSON response")
-            return parsed_json
+            return parsed_json, None
         except json.JSONDecodeError as e:
             logger.error("Failed to parse JSON response: %s", str(e))
-            return create_default_response(f"JSON parsing error: {str(e)}")
+            error = f"JSON parsing error: {str(e)}"
+            return create_default_response(error), error
             
     except Exception as e:
         logger.error("Error in Gemini analysis: %s", str(e))
-        return create_default_response(str(e))
+        return create_default_response(str(e)), str(e)
 
 def create_default_response(error_message):
     return {
@@ -335,26 +354,102 @@ def create_default_response(error_message):
         }
     }
 
+def create_batch_request_entry(gcs_audio_uri):
+    return {
+        "request": {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [
+                        {"text": prompt},
+                        {"file_data": {"file_uri": gcs_audio_uri, "mime_type": "audio/mp3"}}
+                    ]
+                }
+            ],
+            "generationConfig": {
+                "temperature": 1,
+                "topP": 0.95,
+                "topK": 40,
+                "maxOutputTokens": 8192,
+                "responseMimeType": "application/json",
+                "responseSchema": response_schema
+            }
+        }
+    }
+
+def record_evaluation(call_id, file_name, gemini_analysis, agent=None, campaign=None):
+    try:
+        search_index.index_analysis(call_id, file_name, gemini_analysis)
+    except Exception as e:
+        logger.error("Failed to index analysis: %s", str(e))
+
+    try:
+        score_stats.record_analysis(call_id, file_name, gemini_analysis, agent=agent, campaign=campaign)
+    except Exception as e:
+        logger.error("Failed to record score stats: %s", str(e))
+
+def handle_batch_result(job_id, item, gemini_analysis):
+    record_evaluation(job_id, item["file_name"], gemini_analysis, item["agent"], item["campaign"])
+    return {
+        "callId": job_id,
+        **item["audio_metrics"],
+        "geminiAnalysis": gemini_analysis
+    }
+
+batch_router = MicroBatchRouter(
+    create_batch_request_entry,
+    handle_batch_result,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_seconds=BATCH_MAX_WAIT_SECONDS,
+    result_ttl_seconds=BATCH_RESULT_TTL_SECONDS
+)
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     if 'audio' not in request.files:
         logger.error("No audio file provided")
         return jsonify({"error": "No audio file provided"}), 400
     
+    priority = request.form.get('priority', 'high')
+    if priority not in ('high', 'low'):
+        logger.error("Invalid priority: %s", priority)
+        return jsonify({"error": "priority must be high or low"}), 400
+
     audio_file = request.files['audio']
-    logger.info("Received audio file: %s", audio_file.filename)
+    agent = request.form.get('agent')
+    campaign = request.form.get('campaign')
+    logger.info("Received audio file: %s (%s priority)", audio_file.filename, priority)
     
     with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
         audio_file.save(temp_file.name)
         try:
             audio_metrics = analyze_audio(temp_file.name)
+
+            if priority == 'low':
+                job_id = batch_router.enqueue(
+                    temp_file.name,
+                    audio_file.filename,
+                    audio_metrics=audio_metrics,
+                    agent=agent,
+                    campaign=campaign
+                )
+                return jsonify({"jobId": job_id, "status": "queued"}), 202
+
             logger.info("Getting Gemini analysis")
-            gemini_analysis = get_gemini_analysis(temp_file.name)
+            gemini_analysis, analysis_error = get_gemini_analysis(temp_file.name)
             
+            call_id = uuid.uuid4().hex
             results = {
+                "callId": call_id,
                 **audio_metrics,
                 "geminiAnalysis": gemini_analysis
             }
+            if analysis_error is not None:
+                results["analysisError"] = analysis_error
+
+            # A failed analysis is only a placeholder: keep it out of /search and /stats
+            if analysis_error is None:
+                record_evaluation(call_id, audio_file.filename, gemini_analysis, agent, campaign)
 
             logger.info("Analysis complete, sending response")
             os.unlink(temp_file.name)
@@ -364,5 +459,64 @@ def analyze():
             os.unlink(temp_file.name)
             return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = batch_router.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify({"jobId": job_id, **job})
+
+def parse_bool_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+@app.route('/search', methods=['GET'])
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "No search query provided"}), 400
+
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = request.args.get('offset', 0, type=int)
+    if offset < 0:
+        return jsonify({"error": "offset must not be negative"}), 400
+
+    try:
+        results = search_index.search(
+            query,
+            field=request.args.get('field'),
+            successful=parse_bool_arg('successful'),
+            classification=request.args.get('classification'),
+            min_compliance=request.args.get('minCompliance', type=float),
+            max_compliance=request.args.get('maxCompliance', type=float),
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"query": query, "results": results})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    try:
+        results = score_stats.stats(
+            group_by=request.args.get('groupBy', 'all'),
+            group_key=request.args.get('key'),
+            start_day=request.args.get('from'),
+            end_day=request.args.get('to'),
+            daily=parse_bool_arg('daily') or False
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"stats": results})
+
 if __name__ == '__main__':
     app.run(port=5000,debug=True)
\ No newline at end of file
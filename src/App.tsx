@@ -105,6 +105,9 @@ const SCORE_DIVISIONS = {
   'Pricing & Activation': 40
 };
 
+// Low-priority uploads are answered by a batch job, which takes minutes at best
+const JOB_POLL_INTERVAL_MS = 30000;
+
 function MetricCard({ icon: Icon, title, value, color, onClick, isExpanded }: MetricCardProps) {
   return (
     <div 
@@ -146,11 +149,28 @@ function App() {
   const [isProcessing, setIsProcessing] = useState(false);
   const [expandedMetric, setExpandedMetric] = useState<string | null>(null);
   const [selectedFilesToUpload, setSelectedFilesToUpload] = useState<Set<string>>(new Set());
+  const [lowPriority, setLowPriority] = useState(false);
   const fileInputRef = useRef<HTMLInputElement>(null);
 
+  const waitForBatchJob = async (jobId: string): Promise<AudioMetrics> => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+
+      const response = await fetch(`http://127.0.0.1:5000/jobs/${jobId}`);
+      if (!response.ok) {
+        throw new Error('Network response was not ok');
+      }
+
+      const job = await response.json();
+      if (job.status === 'completed') return job.result;
+      if (job.status === 'error') throw new Error(job.error);
+    }
+  };
+
   const processFile = async (file: File): Promise<void> => {
     const formData = new FormData();
     formData.append('audio', file);
+    formData.append('priority', lowPriority ? 'low' : 'high');
 
     setAudioFiles(prev => prev.map(f => 
       f.name === file.name ? { ...f, status: 'processing' } : f
@@ -166,7 +186,10 @@ function App() {
         throw new Error('Network response was not ok');
       }
 
-      const data = await response.json();
+      let data = await response.json();
+      if (response.status === 202) {
+        data = await waitForBatchJob(data.jobId);
+      }
       
       setAudioFiles(prev => prev.map(f => 
         f.name === file.name ? { ...f, status: 'completed', metrics: data } : f
@@ -260,6 +283,17 @@ function App() {
                 accept="audio/*"
               />
             </label>
+            {audioFiles.length > 0 && !isProcessing && (
+              <label className="flex items-center space-x-2 text-gray-300 cursor-pointer">
+                <input
+                  type="checkbox"
+                  checked={lowPriority}
+                  onChange={() => setLowPriority(prev => !prev)}
+                  className="w-4 h-4 rounded border-gray-300 text-cyan-600 focus:ring-cyan-500"
+                />
+                <span>Low priority (batch)</span>
+              </label>
+            )}
             {audioFiles.length > 0 && !isProcessing && (
               <button
                 onClick={handleStartProcessing}